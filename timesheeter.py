@@ -3,103 +3,220 @@
 import re
 import os
 import sys
+import pickle
+import atexit
 import signal
-import configparser
-from datetime import date
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
 
 import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+# readline is not available on every platform, the input works without it too.
+try:
+    import readline
+except ImportError:
+    readline = None
 
 # Some global variable
 CONFIG_FILE_NAME = '.tsconf'
+# Sections of the config and the options required in them.
+CONFIG_SCHEMA = {
+    'AUTH': ('CredentialPath',),
+    'SHEET': ('Name', 'TabTitle'),
+    'INTERFACE': ('DisplayRows',),
+}
+# Directory of the files cached between the runs.
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'timesheeter')
+CONFIG_CACHE_FILE = os.path.join(CACHE_DIR, 'config.pkl')
+HANDLES_CACHE_FILE = os.path.join(CACHE_DIR, 'handles.pkl')
+STATE_CACHE_FILE = os.path.join(CACHE_DIR, 'state.pkl')
+TOKEN_CACHE_FILE = os.path.join(CACHE_DIR, 'token.pkl')
+PENDING_CACHE_FILE = os.path.join(CACHE_DIR, 'pending.pkl')
+HISTORY_FILE = os.path.join(CACHE_DIR, 'history')
+# Number of inputs kept in the history.
+HISTORY_LENGTH = 1000
+# Scopes of the access token. The Drive scope is needed to open the
+# spreadsheet by its title.
+SCOPE = ('https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive')
+# Save the pending rows after this many entries, so a crash can't lose many.
+FLUSH_EVERY = 5
+# Don't reuse a cached token which expires sooner than this.
+TOKEN_EXPIRY_MARGIN = timedelta(seconds=60)
+# Form of the dates in the sheet, e.g. 2012.07.27.
+DATE_RE = re.compile(r'^\d{4}\.\d{2}\.\d{2}\.$')
+# Lines of the config file, e.g. [SHEET] and Name = Timesheet or Name: Timesheet.
+SECTION_RE = re.compile(r'^\[(\w+)\][ \t]*$')
+OPTION_RE = re.compile(r'^(\w+)[ \t]*[=:][ \t]*(.*?)[ \t]*$')
+# The option names are case-insensitive, map them to the names used in the schema.
+OPTION_NAMES = {option.lower(): option for options in CONFIG_SCHEMA.values() for option in options}
 
 # Store the actual config.
 config = None
-# Hold reference to the actual worksheet object.
-worksheet = None
-# Store the index of the last row on the actual worksheet.
+# The options of the config. Set once the config is loaded.
+cred_path = None
+spreadsheet_name = None
+worksheet_name = None
+display_rows = 0
+# The worksheet is opened in the background. Use get_worksheet() to access it.
+worksheet_future = None
+# Rows entered by the user, but not written to the worksheet yet.
+pending_rows = []
+# Index of the last row with a date and whether there are blank rows above it.
+# The A column is read once per run (see read_first_column), then it's tracked here.
 last_row_index = 0
+contiguous_table = None
+# The last rows of the worksheet, including the pending ones. It's only kept
+# in memory, so every run fetches the rows from the sheet on the first list.
+recent_rows = deque()
 
 
-def sigint_handler(signum, frame):
+def signal_handler(signum, frame):
     """
-    Handle the SIGINT signal.
+    Handle the SIGINT, SIGTERM and SIGHUP signals.
     """
 
-    # If we get SIGINT (mostly from CTRL+C) exit from the script.
-    if signum == signal.SIGINT:
-        sys.exit(1)
+    # Exit from the script. The pending rows are saved on the way out (see main).
+    # If the rows are being sent, the sending is interrupted. They are still in
+    # the cache, so they're sent on the next run.
+    sys.exit(1)
 
 
 def load_config():
     """
     Load the config.
-    return:
-        False if not found or invalid
-        True if valid config is exits and loaded.
+    If the config file is not changed since the last run, the cached config is used.
+    Return a tuple. (True|False, None|'Error message string')
     """
 
     global config
 
-    # Init the config object.
-    config = configparser.ConfigParser()
-
     # Check the config file is exists.
     if not os.path.isfile(CONFIG_FILE_NAME):
-        return False
+        return (False, 'Config file is not found.')
+
+    config_path = os.path.abspath(CONFIG_FILE_NAME)
+    mtime_ns = os.stat(CONFIG_FILE_NAME).st_mtime_ns
+
+    # Use the cached config if it's made from the same file.
+    cached = load_cache(CONFIG_CACHE_FILE)
+    if cached and cached.get('path') == config_path and cached.get('mtime_ns') == mtime_ns:
+        config = cached['config']
+
+        # The credential file is not part of the config, it can be moved since.
+        if not os.path.isfile(config['AUTH']['CredentialPath']):
+            return (False, 'Credential\'s path is invalid.')
+
+        return (True, None)
 
     # So the config is exists, let's read it.
-    config.read(CONFIG_FILE_NAME)
+    with open(CONFIG_FILE_NAME) as config_file:
+        config = parse_config(config_file.read())
 
     # Now validate.
     validation = validate_config()
 
+    # Cache the valid config, so the next run can skip the parsing.
+    if validation[0]:
+        save_cache(CONFIG_CACHE_FILE, {
+            'path': config_path,
+            'mtime_ns': mtime_ns,
+            'config': config,
+        })
+
     # Return the validation. It contains the result.
     return validation
 
 
+def parse_config(text):
+    """
+    Parse the text of the config file. Only sections and simple 'Key = value'
+    or 'Key: value' options are supported, the other lines (e.g. comments) are
+    skipped. Like in configparser, the option names are case-insensitive.
+    text: content of the config file (string).
+    Return a dict of the sections, each is a dict of its options.
+    """
+
+    parsed = {}
+    section = None
 
-def validate_config():
+    for line in text.splitlines():
+        match = SECTION_RE.match(line)
+        if match:
+            section = parsed.setdefault(match.group(1), {})
+            continue
+
+        match = OPTION_RE.match(line)
+        if match and section is not None:
+            name = match.group(1)
+            section[OPTION_NAMES.get(name.lower(), name)] = match.group(2)
+
+    return parsed
+
+
+def load_cache(path):
     """
-    Validate the config file.
-    Return a tuple. (True|False, None|'Error message string')
+    Load a pickled object from the cache.
+    path: path of the cache file.
+    Return the object or None if the cache is missing or unreadable.
     """
 
-    # Check the secitons.
-    if not config.has_section('AUTH'):
-        return (False, 'AUTH section is invalid.')
+    try:
+        with open(path, 'rb') as cache_file:
+            return pickle.load(cache_file)
+    except (OSError, pickle.PickleError, EOFError, AttributeError):
+        return None
 
-    if not config.has_section('SHEET'):
-        return (False, 'SHEET section is invalid.')
 
-    if not config.has_section('INTERFACE'):
-        return (False, 'INTERFACE section is invalid.')
+def save_cache(path, data):
+    """
+    Save the object into the cache. Errors are ignored, the cache is optional.
+    The file is replaced at once, so it's never left half written.
+    path: path of the cache file.
+    data: the object to pickle.
+    """
 
-    # Check the keys in the sections.
-    if not config.has_option('AUTH', 'CredentialPath'):
-        return (False, 'CredentialPath option is invalid in the AUTH section.')
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # The cache can hold an access token, so only the user can read it.
+        # mkstemp creates the file with 0600.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with open(fd, 'wb') as cache_file:
+                pickle.dump(data, cache_file)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    except OSError:
+        pass
 
-    if not config.has_option('SHEET', 'Name'):
-        return (False, 'Name option is invalid in the SHEET section.')
 
-    if not config.has_option('SHEET', 'TabTitle'):
-        return (False, 'TabTitle option is invalid in the SHEET section.')
+def validate_config():
+    """
+    Validate the config file.
+    Return a tuple. (True|False, None|'Error message string')
+    """
+
+    # Check the sections and their options. Every option must be non empty.
+    for section, options in CONFIG_SCHEMA.items():
+        if section not in config:
+            return (False, '{0} section is invalid.'.format(section))
 
-    if not config.has_option('INTERFACE', 'DisplayRows'):
-        return (False, 'DisplayRows option is invalid in the INTERFACE section.')
+        missing = [option for option in options if not config[section].get(option)]
+        if missing:
+            return (False, '{0} option is invalid in the {1} section.'.format(', '.join(missing), section))
 
     # Check if the credential file exits.
     if not os.path.isfile(config['AUTH']['CredentialPath']):
         return (False, 'Credential\'s path is invalid.')
 
-    # Check if the other options non empty.
-    if not config['SHEET']['Name']:
-        return (False, 'Spreadsheet name is invalid.')
-
-    if not config['SHEET']['TabTitle']:
-        return (False, 'Spreadsheet tab title is invalid.')
-
-    if not config['INTERFACE']['DisplayRows'] or not is_int(config['INTERFACE']['DisplayRows']):
+    # At least one row is displayed, the list of the recent rows can't be shorter.
+    if not is_int(config['INTERFACE']['DisplayRows']) or int(config['INTERFACE']['DisplayRows']) < 1:
         return (False, 'Interface DisplayRows is invalid.')
 
     # Everything seems okay.
@@ -108,10 +225,15 @@ def validate_config():
 
 def init():
     """
-    Initialize the application and set the worksheet object.
+    Initialize the application and start opening the worksheet in the background.
     """
 
-    global worksheet
+    global worksheet_future
+    global cred_path
+    global spreadsheet_name
+    global worksheet_name
+    global display_rows
+    global recent_rows
 
     # Result of the config load.
     is_loaded, error_message = load_config()
@@ -122,58 +244,273 @@ def init():
         print('ERROR:', error_message)
         sys.exit(1)
 
-    # Get the options.
+    # Get the options, so we don't have to look them up in the config again.
     cred_path = config['AUTH']['CredentialPath']
     spreadsheet_name = config['SHEET']['Name']
     worksheet_name = config['SHEET']['TabTitle']
+    display_rows = int(config['INTERFACE']['DisplayRows'])
+    recent_rows = deque(maxlen=display_rows)
 
-    # Authorization.
-    scope = ['https://spreadsheets.google.com/feeds']
-    creds = ServiceAccountCredentials.from_json_keyfile_name(cred_path, scope)
+    # The authorization takes a while, so do it while the user types. The
+    # thread is a daemon, so an exit doesn't wait for it.
+    worksheet_future = Future()
+    threading.Thread(target=open_worksheet_in_background, daemon=True).start()
+
+
+def open_worksheet_in_background():
+    """
+    Open the worksheet and pass the result or the error to worksheet_future.
+    """
+
+    try:
+        worksheet_future.set_result(open_worksheet())
+    except Exception as e:
+        worksheet_future.set_exception(e)
+
+
+def open_worksheet():
+    """
+    Authorize and open the worksheet. It runs in the background, so it
+    doesn't print or exit, the errors are raised to get_worksheet().
+    Return the worksheet object.
+    """
 
+    # Authorization.
     try:
-        client = gspread.authorize(creds)
+        client = authorize()
     except Exception as e:
-        print('Error during the authorization:', e)
+        raise RuntimeError('Error during the authorization: {0}'.format(e)) from e
+
+    # Try the ids from the last run first, it's faster than searching by name.
+    worksheet = open_cached_worksheet(client)
+    if worksheet is not None:
+        return worksheet
 
     # Get the spreadsheet first.
     try:
         spreadsheet = client.open(spreadsheet_name)
-    except gspread.SpreadsheetNotFound:
-        print('Error! The spreadsheet is not found:', spreadsheet_name)
-        sys.exit(1)
+    except gspread.SpreadsheetNotFound as e:
+        raise RuntimeError('The spreadsheet is not found: {0}'.format(spreadsheet_name)) from e
 
     # Now get the sheet only.
     try:
         worksheet = spreadsheet.worksheet(worksheet_name)
-    except gspread.WorksheetNotFound:
-        print('Error! The worksheet is not found:', worksheet_name)
+    except gspread.WorksheetNotFound as e:
+        raise RuntimeError('The worksheet is not found: {0}'.format(worksheet_name)) from e
+
+    # Remember the ids for the next run.
+    save_cache(HANDLES_CACHE_FILE, {
+        'spreadsheet_name': spreadsheet_name,
+        'worksheet_name': worksheet_name,
+        'spreadsheet_id': spreadsheet.id,
+        'worksheet_id': worksheet.id,
+    })
+
+    return worksheet
+
+
+def worksheet_failed():
+    """
+    Check whether the worksheet could not be opened, without waiting for it.
+    Return True if opening has failed, otherwise False.
+    """
+
+    return worksheet_future.done() and worksheet_future.exception() is not None
+
+
+def check_worksheet():
+    """
+    If the worksheet could not be opened, print the error then exit.
+    It doesn't wait, so it can be called before every prompt.
+    """
+
+    if worksheet_failed():
+        get_worksheet()
+
+
+def get_worksheet():
+    """
+    Wait for the worksheet to be opened. If it can't be opened, print the
+    error then exit.
+    Return the worksheet object.
+    """
+
+    try:
+        return worksheet_future.result()
+    except Exception as e:
+        print('\r\nERROR:', e)
+        if pending_rows:
+            print('The entries are kept and will be saved on the next run.')
         sys.exit(1)
 
 
-def get_last_row_index():
+def authorize():
+    """
+    Authorize with the service account.
+    The access token is cached, so it's only requested again when it expires.
+    Return the authorized gspread client.
+    """
+
+    creds = Credentials.from_service_account_file(cred_path, scopes=SCOPE)
+
+    # The token belongs to the key file and the account in it. If the file is
+    # replaced (e.g. the key is rotated), the cached token is not valid anymore.
+    token_key = {
+        'cred_path': cred_path,
+        'cred_mtime_ns': os.stat(cred_path).st_mtime_ns,
+        'account': creds.service_account_email,
+        'scope': SCOPE,
+    }
+
+    # Reuse the token from the last run if it's made for the same key and
+    # scopes, and it's still valid for a while.
+    # The expiry of the credentials is a naive UTC datetime.
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    cached = load_cache(TOKEN_CACHE_FILE)
+    if cached and cached.get('key') == token_key \
+            and cached.get('expiry') and cached['expiry'] > now + TOKEN_EXPIRY_MARGIN:
+        creds.token = cached['token']
+        creds.expiry = cached['expiry']
+    else:
+        creds.refresh(Request())
+        save_cache(TOKEN_CACHE_FILE, {
+            'key': token_key,
+            'token': creds.token,
+            'expiry': creds.expiry,
+        })
+
+    return gspread.Client(auth=creds)
+
+
+def open_cached_worksheet(client):
+    """
+    Open the worksheet by the ids cached on the last run.
+    client: the authorized gspread client.
+    Return the worksheet or None if there is no usable cache.
+    """
+
+    cached = load_cache(HANDLES_CACHE_FILE)
+
+    # The cache is only valid for the same spreadsheet and tab.
+    if not cached or cached.get('spreadsheet_name') != spreadsheet_name \
+            or cached.get('worksheet_name') != worksheet_name:
+        return None
+
+    # Opening by id skips the title search in the Drive.
+    try:
+        spreadsheet = client.open_by_key(cached['spreadsheet_id'])
+        return spreadsheet.get_worksheet_by_id(cached['worksheet_id'])
+    except (gspread.SpreadsheetNotFound, gspread.WorksheetNotFound, gspread.exceptions.APIError):
+        return None
+
+
+def flush_pending_rows():
+    """
+    Write the pending rows after the last row of the worksheet.
+    If it fails, the rows are kept for the next try. They're also kept in the
+    cache, so they are not lost even if the script exits.
+    Return True if every row is saved, otherwise False.
+    """
+
+    global last_row_index
+
+    if not pending_rows:
+        return True
+
+    # Wait for the worksheet before taking out the rows, so they're kept if
+    # it can't be opened.
+    worksheet = get_worksheet()
+
+    # Take the rows out of the buffer first, so a second call can't send them again.
+    rows = pending_rows[:]
+    del pending_rows[:]
+
+    try:
+        if contiguous_table is None:
+            read_first_column(worksheet)
+
+        if contiguous_table:
+            # The API finds the end of the table starting from A1 and appends
+            # after it in one request.
+            worksheet.append_rows(rows, value_input_option='USER_ENTERED',
+                                  insert_data_option='INSERT_ROWS', table_range='A1')
+        else:
+            # Older versions left blank rows between the entries. The API would
+            # append after the first gap, so write right after the last row.
+            row_index_from = last_row_index + 1
+            row_index_to = last_row_index + len(rows)
+
+            # Make room for the rows if the sheet is full.
+            if row_index_to > worksheet.row_count:
+                worksheet.add_rows(row_index_to - worksheet.row_count)
+
+            worksheet.update('A{0}:D{1}'.format(row_index_from, row_index_to), rows,
+                             value_input_option='USER_ENTERED')
+
+        last_row_index += len(rows)
+    except Exception as e:
+        pending_rows[:0] = rows
+        print('\r\nERROR: The entries could not be saved:', e)
+        print('They are kept and will be saved on the next try.')
+        return False
+    except BaseException:
+        # Interrupted, e.g. by a signal. Keep the rows, so they're not lost.
+        pending_rows[:0] = rows
+        raise
+    else:
+        save_state(rows[-1])
+        return True
+    finally:
+        save_pending_rows()
+
+
+def read_first_column(worksheet):
     """
-    Set the number of the last row's index, which contains anything.
+    Read the A column to find the last row and the blank rows above it.
+    Every entry has a date in the A column (see validate_row), so its length
+    gives the index of the last row, even if there are blank rows between the entries.
+    worksheet: the worksheet object.
+    Return the index of the last row.
     """
 
     global last_row_index
-    global worksheet
+    global contiguous_table
+
+    dates = worksheet.col_values(1)
+    last_row_index = len(dates)
+    contiguous_table = all(dates)
+
+    return last_row_index
+
+
+def save_pending_rows():
+    """
+    Save the pending rows into the cache, so they're not lost if the script exits.
+    """
 
-    # get_all_values() returns a list which length give the number of the rows.
-    last_row_index = len(worksheet.get_all_values())
+    save_cache(PENDING_CACHE_FILE, {
+        'spreadsheet_name': spreadsheet_name,
+        'worksheet_name': worksheet_name,
+        'rows': list(pending_rows),
+    })
 
 
-def write_row(row_number, row_data):
+def load_pending_rows():
     """
-    Write the row into the given postion.
-    row_number: number of the row to write. (int)
-    row_data: tuple with the datas write to cells.
+    Load the rows which could not be saved on the last run.
     """
 
-    global worksheet
+    cached = load_cache(PENDING_CACHE_FILE)
+
+    # The rows are only valid for the same spreadsheet and tab.
+    if not cached or cached.get('spreadsheet_name') != spreadsheet_name \
+            or cached.get('worksheet_name') != worksheet_name or not cached.get('rows'):
+        return
 
-    for column in range(0, len(row_data)):
-        worksheet.update_cell(row_number, column + 1, row_data[column])
+    pending_rows.extend(cached['rows'])
+    recent_rows.extend(cached['rows'])
+    print('{0} entries of the last run are not saved yet. They will be saved with the new ones.'
+          .format(len(cached['rows'])))
 
 
 def get_rows_from_user(last_row):
@@ -182,18 +519,17 @@ def get_rows_from_user(last_row):
     last_row: last row in the sheet (list or None).
     """
 
-    global last_row_index
-    global worksheet
-
-    last_row = last_row
-
     # Store previous values.
     entry_date = ''
-    project_name = last_row[2] if last_row[2] is not None else ''
-    work_hour = last_row[1] if last_row[1] is not None else ''
+    # An empty worksheet has no last row, so there are no previous values.
+    project_name = last_row[2] if last_row is not None else ''
+    work_hour = last_row[1] if last_row is not None else ''
 
     # Start an infinity loop.
     while True:
+        # Report it early if the worksheet could not be opened meanwhile.
+        check_worksheet()
+
         # New line.
         print('')
 
@@ -201,38 +537,99 @@ def get_rows_from_user(last_row):
         entry_date = date.today().isoformat()
         # Format the string from 2012-07-27 to 2012.07.27.
         entry_date = entry_date.replace('-', '.') + '.'
-        entry_date_raw = input('Date [{0}]: '.format(entry_date))
+        entry_date_raw = input_with_default('Date', entry_date)
         entry_date = entry_date_raw if validate_date(entry_date_raw) else entry_date
 
-        project_name_raw = input('Project name [{0}]: '.format(project_name))
-        project_name = project_name_raw if project_name_raw is not '' else project_name
+        project_name_raw = input_with_default('Project name', project_name)
+        project_name = project_name_raw if project_name_raw != '' else project_name
 
-        work_hour_raw = input('Work hours [{0}]: '.format(work_hour))
-        work_hour = work_hour_raw if work_hour_raw is not '' else work_hour
+        work_hour_raw = input_with_default('Work hours', work_hour)
+        work_hour = work_hour_raw if work_hour_raw != '' else work_hour
 
         description = input('Description: ')
 
-        row = (entry_date, work_hour, project_name, description)
+        # Build the row as a list once, it's stored and sent as it is.
+        row = [entry_date, work_hour, project_name, description]
 
         # If our new row is invalid, start again.
         if not validate_row(row):
             print('\r\nERROR: The given row is invalid. Pleasy try again!')
             continue
 
-        if entry_date == last_row[0]:
-            write_row(last_row_index + 1, row)
-        else:
-            last_row_index += 1
-            write_row(last_row_index + 1, row)
+        # Collect the rows and write them together later.
+        pending_rows.append(row)
+        recent_rows.append(row)
+        save_pending_rows()
 
-        last_row_index += 1
         last_row = row
-        print('\r\nEntry saved!\r\n')
+        print('\r\nEntry added!')
+
+        if len(pending_rows) >= FLUSH_EVERY and flush_pending_rows():
+            print('Entries saved!')
+
+        print('')
 
         if not show_options(last_row):
             break
 
 
+def input_with_default(prompt, default):
+    """
+    Ask the user for a value.
+    With readline the default is prefilled, so it can be edited instead of retyped.
+    Without it the default is shown in brackets.
+    prompt: text to display (string).
+    default: the default value (string).
+    Return the typed value.
+    """
+
+    if readline is None:
+        return input('{0} [{1}]: '.format(prompt, default))
+
+    def insert_default():
+        readline.insert_text(default)
+        readline.redisplay()
+
+    readline.set_pre_input_hook(insert_default)
+    try:
+        return input('{0}: '.format(prompt))
+    finally:
+        readline.set_pre_input_hook()
+
+
+def load_history():
+    """
+    Load the input history of the previous runs and save it on exit.
+    """
+
+    if readline is None:
+        return
+
+    readline.set_history_length(HISTORY_LENGTH)
+
+    try:
+        readline.read_history_file(HISTORY_FILE)
+    except OSError:
+        pass
+
+    atexit.register(save_history)
+
+
+def save_history():
+    """
+    Save the input history. Errors are ignored, the history is optional.
+    """
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # The history holds the descriptions, so only the user can read it.
+        os.close(os.open(HISTORY_FILE, os.O_WRONLY | os.O_CREAT, 0o600))
+        os.chmod(HISTORY_FILE, 0o600)
+        readline.write_history_file(HISTORY_FILE)
+    except OSError:
+        pass
+
+
 def show_options(last_row):
     """
     Show the options. The user can choose what to do.
@@ -240,21 +637,22 @@ def show_options(last_row):
     """
 
     while True:
-        choose = input('What to do? (Q)uit/(L)ist/(N)ew [N]: ')
+        check_worksheet()
+        choose = input('What to do? (Q)uit/(L)ist/(N)ew [N]: ').lower()
 
-        if choose is '' or choose.lower()[0] is 'n':
+        if choose == '' or choose.startswith('n'):
             return True
-        elif choose.lower()[0] is 'q':
+        elif choose.startswith('q'):
             return False
-        elif choose.lower()[0] is 'l':
-            last_row = print_last_rows()
+        elif choose.startswith('l'):
+            last_row = list_last_rows()
 
 
 
 def validate_row(row):
     """
     Validate the row what a user typed.
-    row: tuple
+    row: list
     Return True if valide, otherwise False.
     """
 
@@ -274,76 +672,170 @@ def validate_date(date_string):
     """
 
     # Simple regex matching. Only validate on the form not on the values.
-    return True if re.match(r'^\d{4}.\d{2}.\d{2}.$', date_string) else False
+    return DATE_RE.match(date_string) is not None
 
 
 def is_int(value):
     """
-    Try to parse the value to int.
+    Check the value can be parsed to int.
     Return True if can and False if cannot.
     """
 
-    try:
-        num = int(value)
-    except ValueError:
-        return False
+    # Check the digits instead of parsing, so no exception is raised on failure.
+    value = value.strip()
+    digits = value[1:] if value[:1] in ('+', '-') else value
 
-    return True
+    return digits.isdecimal()
+
+
+def fetch_startup_state():
+    """
+    Fetch the last rows of the worksheet.
+    Return the list of the last rows. Every row is padded to four cells.
+    """
+
+    # Fetch only the first column instead of the whole sheet.
+    worksheet = get_worksheet()
+    row_index_to = read_first_column(worksheet)
+    count = display_rows
+
+    if row_index_to == 0:
+        return []
 
+    row_index_from = row_index_to - count if (row_index_to - count) > 0 else 0
 
-def print_last_rows():
+    # Get all of the displayed rows with one request instead of one per row.
+    rows = worksheet.get('A{0}:D{1}'.format(row_index_from + 1, row_index_to))
+    rows = [row + [''] * (4 - len(row)) for row in rows]
+
+    # Remember them, so they can be listed again without fetching.
+    recent_rows.clear()
+    recent_rows.extend(rows)
+
+    return rows
+
+
+def list_last_rows():
     """
-    Get the last rows from the sheet.
+    Print the last rows. They are only fetched from the worksheet if we
+    don't know enough of them yet in this run.
     Return the last row in the worksheet which contains data.
     """
 
-    global last_row_index
-    global worksheet
+    # Save the pending rows first, so they're listed too. If they can't be
+    # saved, list the rows we know.
+    fetched = len(recent_rows) < display_rows and flush_pending_rows()
 
-    last_row = None
-    count=int(config['INTERFACE']['DisplayRows'])
+    if fetched:
+        fetch_startup_state()
 
-    row_index_from = last_row_index - count if (last_row_index - count) > 0 else 0
+    last_row = print_last_rows(recent_rows)
 
-    row_index_to = last_row_index if last_row_index > row_index_from else row_index_from + 1
+    if fetched:
+        save_state(last_row)
 
-    for row_index in range(row_index_from + 1, row_index_to + 1):
-        row = worksheet.row_values(row_index)
+    return last_row
+
+
+def print_last_rows(rows):
+    """
+    Print the given rows.
+    rows: the rows to print (iterable of lists).
+    Return the last row which contains data.
+    """
 
-        if row[0] is '':
+    last_row = None
+
+    for row in rows:
+        if not row[0]:
             print('-')
         else:
-            print('{0}\t{1}\t{2}\t{3}'.format(row[0], row[1], row[2], row[3]))
+            print('\t'.join(row))
             last_row = row
 
     return last_row
 
 
+def load_state():
+    """
+    Load the state saved on the last run.
+    Return the last row or None if there is no saved state for the worksheet.
+    """
+
+    state = load_cache(STATE_CACHE_FILE)
+
+    # The state is only valid for the same spreadsheet and tab.
+    if not state or state.get('spreadsheet_name') != spreadsheet_name \
+            or state.get('worksheet_name') != worksheet_name:
+        return None
+
+    return state['last_row']
+
+
+def save_state(last_row):
+    """
+    Save the last row, so the next run doesn't have to fetch it.
+    last_row: the last row in the worksheet (list, tuple or None).
+    """
+
+    # Nothing to seed the next run with.
+    if last_row is None:
+        return
+
+    save_cache(STATE_CACHE_FILE, {
+        'spreadsheet_name': spreadsheet_name,
+        'worksheet_name': worksheet_name,
+        'last_row': list(last_row),
+    })
+
+
 def main():
     """
     The main function.
     """
 
-    # Bind a signal callback.
-    signal.signal(signal.SIGINT, sigint_handler)
+    # Bind a signal callback. SIGHUP is not available on every platform.
+    for signum in (signal.SIGINT, signal.SIGTERM, getattr(signal, 'SIGHUP', None)):
+        if signum is not None:
+            signal.signal(signum, signal_handler)
 
     # Initialize the whole thing.
     print('Starting initialization...', end='')
     init()
     print('[DONE]')
 
-    # Get the number of the last row.
-    print('Fetching last row...', end='')
-    get_last_row_index()
-    print('[DONE]')
+    # Use the state of the last run if we have one, so we don't have to
+    # fetch anything. The first list of the run fetches the rows from the sheet.
+    last_row = load_state()
 
-    # Fetch the last rows and write 'em to the output. And get some information 'bout the last row.
-    print('Fetching the content of the last rows...\r\n')
-    last_row = print_last_rows()
+    if last_row is None:
+        # Get the number of the last row and the content of the last rows.
+        print('Fetching the last rows...', end='')
+        rows = fetch_startup_state()
+        print('[DONE]\r\n')
+
+        # Write the last rows to the output. And get some information 'bout the last row.
+        last_row = print_last_rows(rows)
+        save_state(last_row)
+    else:
+        print('Last entry: {0}'.format('\t'.join(last_row)))
+
+    load_pending_rows()
 
     # Now we can ask the user for the input.
+    load_history()
     print('\r\nNow you can enter your data!')
-    get_rows_from_user(last_row)
+
+    # CTRL+D ends the input as well. The pending rows are saved however the
+    # input ends, even on exit by a signal.
+    try:
+        get_rows_from_user(last_row)
+    except EOFError:
+        print('')
+    finally:
+        # If the worksheet can't be opened, get_worksheet() has already reported it.
+        if pending_rows and not worksheet_failed() and flush_pending_rows():
+            print('Entries saved!')
 
 
 if __name__ == '__main__':